@@ -0,0 +1,18 @@
+"""
+Shared Supabase client for the maintenance scripts
+"""
+
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
+
+@lru_cache(maxsize=1)
+def get_client():
+    """Return the process-wide Supabase client, creating it on first use"""
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
@@ -3,27 +3,33 @@
 Check what tables exist in the Supabase database
 """
 
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
+from concurrent.futures import ThreadPoolExecutor
+from _supabase import SUPABASE_URL, SUPABASE_KEY, get_client
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     print("❌ Missing Supabase environment variables")
     exit(1)
 
 try:
-    from supabase import create_client
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase = get_client()
 except ImportError:
     print("❌ Supabase Python client not installed")
     exit(1)
 
+# SQL for the RPC used by check_table_names (run once in the Supabase SQL editor)
+TABLES_EXIST_SQL = """
+CREATE OR REPLACE FUNCTION tables_exist(names text[])
+RETURNS TABLE(name text, present boolean, row_count bigint) AS $$
+    SELECT n,
+           to_regclass('public.' || quote_ident(n)) IS NOT NULL,
+           COALESCE((SELECT s.n_live_tup FROM pg_stat_user_tables s
+                     WHERE s.relid = to_regclass('public.' || quote_ident(n))), 0)
+    FROM unnest(names) AS n
+$$ LANGUAGE sql STABLE;
+"""
+
 def check_table_names():
-    """Check what tables exist by trying to access them"""
+    """Check what tables exist with a single catalog query"""
     print("🔍 Checking available tables...")
     
     # List of possible table names to check
@@ -38,42 +44,49 @@ def check_table_names():
     
     existing_tables = {}
     
-    for table_name in possible_tables:
-        try:
-            result = supabase.table(table_name).select('count').execute()
-            count = result.data[0]['count'] if result.data else 0
-            existing_tables[table_name] = count
-            print(f"✅ {table_name}: {count} records")
-        except Exception as e:
-            if "does not exist" in str(e):
-                print(f"❌ {table_name}: table does not exist")
-            else:
-                print(f"⚠️  {table_name}: error - {e}")
+    try:
+        result = supabase.rpc('tables_exist', {'names': possible_tables}).execute()
+    except Exception as e:
+        print(f"⚠️  Could not query table catalog: {e}")
+        print("Create the helper function first:")
+        print(TABLES_EXIST_SQL)
+        return existing_tables
+    
+    for row in result.data or []:
+        if row['present']:
+            existing_tables[row['name']] = row['row_count']
+            print(f"✅ {row['name']}: {row['row_count']} records")
+        else:
+            print(f"❌ {row['name']}: table does not exist")
     
     return existing_tables
 
-def check_table_structure(table_name):
-    """Check the structure of a specific table"""
-    print(f"\n🔍 Checking structure of {table_name}...")
-    
+def fetch_table_sample(table_name):
+    """Fetch a few sample records, returning the exception instead of raising"""
     try:
-        # Get a few sample records to see the structure
-        result = supabase.table(table_name).select('*').limit(2).execute()
-        
-        if result.data:
-            print(f"✅ Table {table_name} has data")
-            for i, record in enumerate(result.data):
-                print(f"   Record {i+1} columns:")
-                for key, value in record.items():
-                    if isinstance(value, dict) or isinstance(value, list):
-                        print(f"     {key}: {type(value).__name__} (complex data)")
-                    else:
-                        print(f"     {key}: {value}")
-        else:
-            print(f"⚠️  Table {table_name} exists but has no data")
-            
+        return supabase.table(table_name).select('*').limit(2).execute().data
     except Exception as e:
-        print(f"❌ Error checking {table_name}: {e}")
+        return e
+
+def check_table_structure(table_name, sample):
+    """Check the structure of a specific table from its sample records"""
+    print(f"\n🔍 Checking structure of {table_name}...")
+    
+    if isinstance(sample, Exception):
+        print(f"❌ Error checking {table_name}: {sample}")
+        return
+    
+    if sample:
+        print(f"✅ Table {table_name} has data")
+        for i, record in enumerate(sample):
+            print(f"   Record {i+1} columns:")
+            for key, value in record.items():
+                if isinstance(value, dict) or isinstance(value, list):
+                    print(f"     {key}: {type(value).__name__} (complex data)")
+                else:
+                    print(f"     {key}: {value}")
+    else:
+        print(f"⚠️  Table {table_name} exists but has no data")
 
 def main():
     """Main function"""
@@ -85,15 +98,17 @@ def main():
     
     print(f"\n📊 Summary: Found {len(existing_tables)} tables with data")
     
-    # Check structure of main tables
-    if 'hotel_usuario' in existing_tables:
-        check_table_structure('hotel_usuario')
-    
-    if 'hotels_parallel' in existing_tables:
-        check_table_structure('hotels_parallel')
-    
-    if 'hoteles_parallel' in existing_tables:
-        check_table_structure('hoteles_parallel')
+    # Check structure of main tables (samples fetched concurrently, printed in order)
+    main_tables = [
+        table_name
+        for table_name in ('hotel_usuario', 'hotels_parallel', 'hoteles_parallel')
+        if table_name in existing_tables
+    ]
+    if main_tables:
+        with ThreadPoolExecutor(max_workers=len(main_tables)) as executor:
+            samples = list(executor.map(fetch_table_sample, main_tables))
+        for table_name, sample in zip(main_tables, samples):
+            check_table_structure(table_name, sample)
     
     print("\n💡 Next steps:")
     print("1. Verify the table names match what the API expects")
@@ -3,25 +3,26 @@
 Check what users exist in the Supabase database
 """
 
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
+from _supabase import SUPABASE_URL, SUPABASE_KEY, get_client
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     print("❌ Missing Supabase environment variables")
     exit(1)
 
 try:
-    from supabase import create_client
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase = get_client()
 except ImportError:
     print("❌ Supabase Python client not installed")
     exit(1)
 
+# SQL for the RPC used by check_users (run once in the Supabase SQL editor)
+DISTINCT_USER_IDS_SQL = """
+CREATE OR REPLACE FUNCTION distinct_user_ids()
+RETURNS SETOF uuid AS $$
+    SELECT DISTINCT user_id FROM hotel_usuario
+$$ LANGUAGE sql STABLE;
+"""
+
 def check_users():
     """Check what users exist in the database"""
     print("🔍 Checking users in database...")
@@ -40,12 +41,10 @@ def check_users():
     except Exception as e:
         print(f"⚠️  Could not access auth.users: {e}")
         
-        # Try to get users from hotel_usuario table
+        # Try to get users from hotel_usuario table (deduplicated server-side)
         try:
-            result = supabase.table('hotel_usuario').select('user_id').execute()
-            unique_users = set()
-            for record in result.data:
-                unique_users.add(record['user_id'])
+            result = supabase.rpc('distinct_user_ids').execute()
+            unique_users = result.data or []
             
             print(f"✅ Found {len(unique_users)} unique user_ids in hotel_usuario table:")
             for user_id in unique_users:
@@ -53,6 +52,8 @@ def check_users():
                 
         except Exception as e2:
             print(f"❌ Error accessing hotel_usuario: {e2}")
+            print("If distinct_user_ids is missing, create it first:")
+            print(DISTINCT_USER_IDS_SQL)
 
 def main():
     """Main function"""
@@ -4,23 +4,37 @@ Database Migration Script for Arkus Dynamic Pricing
 This script helps migrate from old schema to new schema and sets up initial data.
 """
 
-import os
 import sys
+import asyncio
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-from supabase import create_client
-import json
-
-load_dotenv()
-
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
+import httpx
+from _supabase import SUPABASE_URL, SUPABASE_KEY, get_client
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     print("❌ Missing SUPABASE_URL or SUPABASE_ANON_KEY environment variables")
     sys.exit(1)
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_client()
+
+REQUIRED_TABLES = ['hotel_usuario', 'hotels_parallel', 'eventos']
+
+async def probe_tables(table_names):
+    """Send a HEAD count request to each table concurrently and return the responses"""
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Prefer": "count=exact"
+    }
+    async with httpx.AsyncClient(base_url=f"{SUPABASE_URL}/rest/v1", headers=headers) as client:
+        return await asyncio.gather(
+            *(client.head(f"/{table_name}", params={"select": "*"}) for table_name in table_names),
+            return_exceptions=True
+        )
+
+def parse_content_range_count(response):
+    """Extract the total row count from a PostgREST Content-Range header ("0-24/N")"""
+    total = response.headers.get("content-range", "").rpartition("/")[2]
+    return int(total) if total.isdigit() else None
 
 def create_tables():
     """Create the new database tables if they don't exist"""
@@ -29,28 +43,21 @@ def create_tables():
     # Note: In production, you would run the SQL from database_schema.sql
     # This is just a helper script to verify the setup
     
-    try:
-        # Test if tables exist by trying to select from them
-        result = supabase.table('hotel_usuario').select('*').limit(1).execute()
-        print("✅ hotel_usuario table exists")
-    except Exception as e:
-        print(f"❌ hotel_usuario table error: {e}")
-        print("Please run the SQL commands from database_schema.sql first")
-        return False
-    
-    try:
-        result = supabase.table('hotels_parallel').select('*').limit(1).execute()
-        print("✅ hotels_parallel table exists")
-    except Exception as e:
-        print(f"❌ hotels_parallel table error: {e}")
-        print("Please run the SQL commands from database_schema.sql first")
-        return False
+    # Test if tables exist with body-less count requests (all at once)
+    responses = asyncio.run(probe_tables(REQUIRED_TABLES))
+    
+    all_present = True
+    for table_name, response in zip(REQUIRED_TABLES, responses):
+        if isinstance(response, Exception):
+            print(f"❌ {table_name} table error: {response}")
+            all_present = False
+        elif not response.is_success:
+            print(f"❌ {table_name} table error: HTTP {response.status_code}")
+            all_present = False
+        else:
+            print(f"✅ {table_name} table exists ({parse_content_range_count(response)} records)")
     
-    try:
-        result = supabase.table('eventos').select('*').limit(1).execute()
-        print("✅ eventos table exists")
-    except Exception as e:
-        print(f"❌ eventos table error: {e}")
+    if not all_present:
         print("Please run the SQL commands from database_schema.sql first")
         return False
     
@@ -119,12 +126,14 @@ def insert_sample_data():
     ]
     
     try:
+        # Single bulk upsert; rows matching an existing (nombre, ciudad) are skipped
+        result = supabase.table('hotels_parallel').upsert(
+            sample_competitors, on_conflict='nombre,ciudad', ignore_duplicates=True
+        ).execute()
+        inserted = {row['nombre'] for row in result.data or []}
+        
         for competitor in sample_competitors:
-            # Check if hotel already exists
-            existing = supabase.table('hotels_parallel').select('id').eq('nombre', competitor['nombre']).execute()
-            
-            if not existing.data:
-                result = supabase.table('hotels_parallel').insert(competitor).execute()
+            if competitor['nombre'] in inserted:
                 print(f"✅ Inserted {competitor['nombre']}")
             else:
                 print(f"⏭️  {competitor['nombre']} already exists")
@@ -141,28 +150,26 @@ def verify_data_integrity():
     
     try:
         # Check competitor data
-        competitors = supabase.table('hotels_parallel').select('*').execute()
+        competitors = supabase.table('hotels_parallel').select('nombre,rooms_jsonb').execute()
         print(f"✅ Found {len(competitors.data)} competitor hotels")
         
         for hotel in competitors.data:
             if hotel.get('rooms_jsonb'):
                 rooms_data = hotel['rooms_jsonb']
-                if isinstance(rooms_data, str):
-                    try:
-                        rooms_data = json.loads(rooms_data)
-                    except:
-                        print(f"⚠️  Warning: Invalid JSON in rooms_jsonb for {hotel['nombre']}")
-                        continue
+                # PostgREST already decodes jsonb; anything else is a schema problem
+                if not isinstance(rooms_data, dict):
+                    print(f"⚠️  Warning: rooms_jsonb is not a JSON object for {hotel['nombre']}")
+                    continue
                 
-                dates = list(rooms_data.keys())
-                print(f"   📅 {hotel['nombre']}: {len(dates)} dates, {len(rooms_data.get(dates[0] or [], []))} room types")
+                first_date = next(iter(rooms_data), None)
+                print(f"   📅 {hotel['nombre']}: {len(rooms_data)} dates, {len(rooms_data.get(first_date, []))} room types")
             else:
                 print(f"⚠️  Warning: No rooms data for {hotel['nombre']}")
         
         # Check if we have any user hotel data
-        user_hotels = supabase.table('hotel_usuario').select('*').limit(1).execute()
-        if user_hotels.data:
-            print(f"✅ Found {len(user_hotels.data)} user hotel records")
+        user_hotels = supabase.table('hotel_usuario').select('*', count='exact', head=True).execute()
+        if user_hotels.count:
+            print(f"✅ Found {user_hotels.count} user hotel records")
         else:
             print("ℹ️  No user hotel data found yet (this is normal for new installations)")
         
@@ -5,13 +5,12 @@ import sys
 import json
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from supabase import create_client
 from playwright.async_api import async_playwright
 import uuid
 import requests
 import random
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from tenacity import retry, stop_after_attempt, wait_fixed
 
 load_dotenv()
@@ -20,8 +19,6 @@ SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("Faltan variables SUPABASE_URL o SUPABASE_KEY")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
@@ -61,12 +58,71 @@ def get_random_user_agent():
     """Devuelve un user-agent aleatorio de la lista."""
     return random.choice(USER_AGENTS)
 
+# Dominios de analítica/anuncios que no aportan nada al scraping
+BLOCKED_DOMAINS = (
+    "doubleclick.net",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "facebook.net",
+    "hotjar.com",
+)
+
+# Argumentos de lanzamiento de Chromium.
+# Imágenes y trackers se bloquean desde Chromium y no con context.route:
+# interceptar peticiones desactiva la caché HTTP del contexto, y cada hotel
+# recarga la misma página una vez por día (JS/CSS se volverían a descargar)
+LAUNCH_ARGS = (
+    "--disable-blink-features=AutomationControlled",
+    "--disable-infobars",
+    "--window-size=1920,1080",
+    "--blink-settings=imagesEnabled=false",
+    "--host-resolver-rules=" + ", ".join(
+        f"MAP {domain} ~NOTFOUND, MAP *.{domain} ~NOTFOUND" for domain in BLOCKED_DOMAINS
+    ),
+)
+
+# Script para ocultar webdriver en cada pestaña
+STEALTH_INIT_SCRIPT = """
+Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+"""
+
+# Selectores de la tabla de habitaciones (precio en orden de preferencia)
+ROOM_TYPE_SELECTOR = "th span.hprt-roomtype-icon-link"
+PRICE_SELECTORS = (
+    "span.js-average-per-night-price",
+    "span.prc-no-css",
+    "div.bui-price-display__value span.prco-valign-middle-helper",
+)
+
+# Recorre las filas de #hprt-table dentro del navegador y devuelve
+# [{"room_type", "price"}] como texto (evita varias idas y vueltas por fila)
+EXTRACT_ROOMS_JS = """
+(rows, [roomTypeSelector, priceSelectors]) => {
+    const rooms = [];
+    for (const row of rows) {
+        const roomTypeEl = row.querySelector(roomTypeSelector);
+        let priceEl = null;
+        for (const td of row.querySelectorAll("td")) {
+            for (const selector of priceSelectors) {
+                priceEl = td.querySelector(selector);
+                if (priceEl) break;
+            }
+            if (priceEl) break;
+        }
+        if (roomTypeEl && priceEl) {
+            rooms.push({room_type: roomTypeEl.innerText.trim(), price: priceEl.innerText.trim()});
+        }
+    }
+    return rooms;
+}
+"""
+
 # =============================
 # Scraping de un solo hotel (en su propia pestaña)
 # =============================
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-async def safe_goto(page, url: str):
-    await page.goto(url)
+async def safe_goto(page, url: str, wait_until: str = "load"):
+    await page.goto(url, wait_until=wait_until)
 
 async def scrape_hotel_details(page, hotel_url: str, dias: int = 15) -> Dict[str, Any]:
     """
@@ -77,12 +133,13 @@ async def scrape_hotel_details(page, hotel_url: str, dias: int = 15) -> Dict[str
     - Tipos de cuarto y precios: tabla #hprt-table, para los próximos 'dias' días
     """
     await safe_goto(page, hotel_url)
-    await page.wait_for_timeout(1000)
     # --- Nombre del hotel ---
     nombre = ""
     try:
-        # Selector principal de nombre
-        nombre = await page.inner_text('h2[data-testid="title"]')
+        # Selector principal de nombre; se espera al título en sí (con timeout
+        # corto) para no tomar otro h2 que aparezca antes: el nombre es la clave
+        # (nombre, ciudad) en Supabase
+        nombre = await page.inner_text('h2[data-testid="title"]', timeout=10000)
     except Exception:
         try:
             # Fallback: cualquier h2
@@ -136,38 +193,21 @@ async def scrape_hotel_details(page, hotel_url: str, dias: int = 15) -> Dict[str
         # Modifica la URL con las nuevas fechas
         new_url = re.sub(r"checkin=\d{4}-\d{2}-\d{2}", f"checkin={checkin}", hotel_url)
         new_url = re.sub(r"checkout=\d{4}-\d{2}-\d{2}", f"checkout={checkout}", new_url)
-        await safe_goto(page, new_url)
-        await asyncio.sleep(1.5)
+        # Espera a que el HTML esté completamente parseado (tabla completa) sin
+        # esperar imágenes ni otros subrecursos
+        await safe_goto(page, new_url, wait_until="domcontentloaded")
         try:
             # Espera a que la tabla de habitaciones esté visible
             await page.wait_for_selector("#hprt-table", timeout=50000, state='visible')
         except Exception:
             continue
-        rows = await page.query_selector_all("#hprt-table tr")
-        day_rooms = []
-        for row in rows:
-            try:
-                # Tipo de cuarto: th span.hprt-roomtype-icon-link
-                room_type_el = await row.query_selector("th span.hprt-roomtype-icon-link")
-                price_el = None
-                tds = await row.query_selector_all("td")
-                for td in tds:
-                    # Precio: span.js-average-per-night-price o span.prc-no-css
-                    price_candidate = await td.query_selector("span.js-average-per-night-price")
-                    if not price_candidate:
-                        price_candidate = await td.query_selector("span.prc-no-css")
-                    if not price_candidate:
-                        price_candidate = await td.query_selector("div.bui-price-display__value span.prco-valign-middle-helper")
-                    if price_candidate:
-                        price_el = price_candidate
-                        break
-                if room_type_el and price_el:
-                    room_text = (await room_type_el.inner_text()).strip()
-                    price_text = (await price_el.inner_text()).strip()
-                    # Guarda el tipo de cuarto y el precio como texto
-                    day_rooms.append({"room_type": room_text, "price": price_text})
-            except Exception:
-                continue
+        # Extrae tipo de cuarto y precio de todas las filas en una sola llamada
+        try:
+            day_rooms = await page.eval_on_selector_all(
+                "#hprt-table tr", EXTRACT_ROOMS_JS, [ROOM_TYPE_SELECTOR, list(PRICE_SELECTORS)]
+            )
+        except Exception:
+            day_rooms = []
         if day_rooms:
             rooms_by_date[checkin] = day_rooms
         else:
@@ -206,93 +246,118 @@ async def scrape_hotels_parallel(ciudad: str, dias: int = 15, headless: bool = F
     async with async_playwright() as p:
         launch_args = {
             "headless": headless,
-            "args": [
-                "--disable-blink-features=AutomationControlled",
-                "--disable-infobars",
-                "--window-size=1920,1080"
-            ]
+            "args": list(LAUNCH_ARGS)
         }
         browser = await p.chromium.launch(**launch_args)
-        # Contexto con user-agent y viewport para camuflaje
-        context = await browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            user_agent=get_random_user_agent()
-        )
-        page = await context.new_page()
-        # Inyectar script para ocultar webdriver
-        await page.add_init_script("""
-Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-""")
-        # Construir URL de búsqueda de hoteles para la ciudad
-        today = datetime.today()
-        tomorrow = today + timedelta(days=1)
-        checkin = today.strftime("%Y-%m-%d")
-        checkout = tomorrow.strftime("%Y-%m-%d")
-        url = f"https://www.booking.com/searchresults.html?ss={ciudad}&checkin={checkin}&checkout={checkout}&group_adults=1&no_rooms=1&group_children=0"
-        await page.goto(url)
-        await page.wait_for_timeout(5000)
-        # --- Obtener enlaces de hoteles de la primera página ---
-        hotel_links = []
-        cards = await page.query_selector_all("a[data-testid='property-card-desktop-single-image']")
-        for card in cards:
-            try:
-                href = await card.get_attribute("href")
-                if href:
-                    # Booking links pueden ser relativos
-                    if href.startswith("/"):
-                        href = "https://www.booking.com" + href
-                    # Añadir fechas a la url si no están
-                    if "checkin=" not in href:
-                        href += f"?checkin={checkin}&checkout={checkout}"
-                    hotel_links.append(href)
-            except Exception:
-                continue
-        logger.info(f"Encontrados {len(hotel_links)} hoteles en la primera página de {ciudad}.")
-        # --- Abrir cada hotel en una nueva pestaña y scrapear en paralelo ---
-        results = []
-        sem = asyncio.Semaphore(concurrencia)  # Limitar concurrencia configurable USAR 9
-        processed_count = 0
-        async def process_hotel(hotel_url: str):
-            hotel_page = None
-            try:
-                async with sem:
-                    hotel_page = await context.new_page()
-                    await hotel_page.set_extra_http_headers({"user-agent": get_random_user_agent()})
-                    await hotel_page.add_init_script("""
-Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-""")
-                    data = await scrape_hotel_details(hotel_page, hotel_url, dias=dias)
-                    results.append(data)
-                    nonlocal processed_count
-                    processed_count += 1
-                    logger.info(f"Hoteles procesados: {processed_count}/{len(hotel_links)}")
-            except Exception as e:
-                logger.error(f"Error en hotel {hotel_url}: {e}")
-            finally:
-                if hotel_page:
-                    try:
-                        await hotel_page.close()
-                    except Exception as close_err:
-                        logger.warning(f"No se pudo cerrar la página de {hotel_url}: {close_err}")
-        # Ejecuta el scraping en paralelo para los primeros 3 hoteles
-        await asyncio.gather(*(process_hotel(url) for url in hotel_links))
-        await browser.close()
+        context = None
+        try:
+            # Contexto con user-agent y viewport para camuflaje
+            context = await browser.new_context(
+                viewport={"width": 1920, "height": 1080},
+                user_agent=get_random_user_agent()
+            )
+            page = await context.new_page()
+            # Inyectar script para ocultar webdriver
+            await page.add_init_script(STEALTH_INIT_SCRIPT)
+            # Construir URL de búsqueda de hoteles para la ciudad
+            today = datetime.today()
+            tomorrow = today + timedelta(days=1)
+            checkin = today.strftime("%Y-%m-%d")
+            checkout = tomorrow.strftime("%Y-%m-%d")
+            url = f"https://www.booking.com/searchresults.html?ss={ciudad}&checkin={checkin}&checkout={checkout}&group_adults=1&no_rooms=1&group_children=0"
+            await page.goto(url)
+            await page.wait_for_timeout(5000)
+            # --- Obtener enlaces de hoteles de la primera página ---
+            hotel_links = []
+            cards = await page.query_selector_all("a[data-testid='property-card-desktop-single-image']")
+            for card in cards:
+                try:
+                    href = await card.get_attribute("href")
+                    if href:
+                        # Booking links pueden ser relativos
+                        if href.startswith("/"):
+                            href = "https://www.booking.com" + href
+                        # Añadir fechas a la url si no están
+                        if "checkin=" not in href:
+                            href += f"?checkin={checkin}&checkout={checkout}"
+                        hotel_links.append(href)
+                except Exception:
+                    continue
+            logger.info(f"Encontrados {len(hotel_links)} hoteles en la primera página de {ciudad}.")
+            # --- Abrir cada hotel en una nueva pestaña y scrapear en paralelo ---
+            results = []
+            sem = asyncio.Semaphore(concurrencia)  # Limitar concurrencia configurable USAR 9
+            processed_count = 0
+            async def process_hotel(hotel_url: str):
+                hotel_page = None
+                try:
+                    async with sem:
+                        hotel_page = await context.new_page()
+                        await hotel_page.set_extra_http_headers({"user-agent": get_random_user_agent()})
+                        await hotel_page.add_init_script(STEALTH_INIT_SCRIPT)
+                        data = await scrape_hotel_details(hotel_page, hotel_url, dias=dias)
+                        results.append(data)
+                        nonlocal processed_count
+                        processed_count += 1
+                        logger.info(f"Hoteles procesados: {processed_count}/{len(hotel_links)}")
+                except Exception as e:
+                    logger.error(f"Error en hotel {hotel_url}: {e}")
+                finally:
+                    if hotel_page:
+                        try:
+                            await hotel_page.close()
+                        except Exception as close_err:
+                            logger.warning(f"No se pudo cerrar la página de {hotel_url}: {close_err}")
+            # Ejecuta el scraping en paralelo para los primeros 3 hoteles
+            await asyncio.gather(*(process_hotel(url) for url in hotel_links))
+        finally:
+            # Cierra el contexto (y sus buffers de red) antes que el navegador
+            if context:
+                await context.close()
+            await browser.close()
         return results
 
 # =============================
 # Inserción en Supabase
 # =============================
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def post_hotel(session: requests.Session, url: str, headers: dict, data: dict):
+def post_hotel(session: requests.Session, url: str, headers: dict, data: Union[Dict[str, Any], List[Dict[str, Any]]]):
     r = session.post(url, headers=headers, json=data)
     return r
 
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+def fetch_existing_hotels(session: requests.Session, url: str, headers: dict, params: Dict[str, str]) -> List[Dict[str, Any]]:
+    r = session.get(url, headers=headers, params=params)
+    r.raise_for_status()
+    return r.json()
+
+def save_pending_hotels(hotels: List[Dict[str, Any]], ciudad: str) -> str:
+    """Guarda los hoteles scrapeados en un JSON local para reinsertarlos después."""
+    filename = f"pending_hotels_{ciudad}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(hotels, f, ensure_ascii=False, indent=2)
+    return filename
+
+def postgrest_in(values: List[str]) -> str:
+    """Construye un filtro PostgREST in.(...) citando cada valor."""
+    quoted = ('"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+    return f"in.({','.join(quoted)})"
+
+def merge_new_dates(existing_rooms: Dict[str, Any], new_rooms: Any) -> Dict[str, Any]:
+    """Devuelve existing_rooms más las fechas de new_rooms que aún no tiene."""
+    merged_rooms = dict(existing_rooms or {})
+    for date_key, rooms_list in (new_rooms.items() if isinstance(new_rooms, dict) else []):
+        if date_key not in merged_rooms:
+            merged_rooms[date_key] = rooms_list
+    return merged_rooms
+
 def insert_hotels_supabase(hotels: List[Dict[str, Any]], ciudad: str):
     """
     Inserta o actualiza cada hotel en la tabla hoteles_parallel de Supabase.
     - Si (nombre, ciudad) ya existe: fusiona rooms_jsonb agregando nuevas fechas y
       actualiza fecha_scrape a hoy.
     - Si no existe: inserta un nuevo registro.
+    Los existentes se consultan en una sola petición y los nuevos se insertan en lote.
     """
     base_url = f"{SUPABASE_URL}/rest/v1/hoteles_parallel"
     headers = {
@@ -301,8 +366,29 @@ def insert_hotels_supabase(hotels: List[Dict[str, Any]], ciudad: str):
         "Content-Type": "application/json"
     }
     with requests.Session() as session:
+        # 1) Buscar de una vez los que ya existen por nombre+ciudad
+        nombres = sorted({hotel.get("nombre") or "" for hotel in hotels})
+        existing_by_name: Dict[str, Dict[str, Any]] = {}
+        if nombres:
+            select_params = {
+                "select": "nombre,rooms_jsonb,fecha_scrape",
+                "nombre": postgrest_in(nombres),
+                "ciudad": f"eq.{ciudad}",
+            }
+            # Si la consulta falla no se puede distinguir nuevos de existentes;
+            # insertarlos todos duplicaría hoteles o perdería el lote completo,
+            # así que se guarda el scrape en disco para reinsertarlo después
+            try:
+                rows = fetch_existing_hotels(session, base_url, headers, select_params)
+                existing_by_name = {row["nombre"]: row for row in rows}
+            except Exception as e:
+                logger.error(f"Error consultando hoteles existentes en {ciudad}, se omite la inserción: {e}")
+                filename = save_pending_hotels(hotels, ciudad)
+                logger.info(f"Hoteles de {ciudad} guardados en {filename}")
+                return
+        new_rows: Dict[str, Dict[str, Any]] = {}
+        today_str = datetime.today().strftime("%Y-%m-%d")
         for hotel in hotels:
-            today_str = datetime.today().strftime("%Y-%m-%d")
             data = {
                 "nombre": hotel["nombre"],
                 "estrellas": hotel["estrellas"],
@@ -315,27 +401,11 @@ def insert_hotels_supabase(hotels: List[Dict[str, Any]], ciudad: str):
             nombre = hotel.get("nombre") or ""
             logger.info(f"[UPSERT] Procesando hotel: {nombre} en ciudad: {ciudad}")
             try:
-                # 1) Buscar si ya existe por nombre+ciudad
-                select_params = {
-                    "select": "id,rooms_jsonb,fecha_scrape",
-                    "nombre": f"eq.{nombre}",
-                    "ciudad": f"eq.{ciudad}",
-                }
-                r_get = session.get(base_url, headers=headers, params=select_params)
-                if r_get.status_code == 200:
-                    existing = r_get.json()
-                else:
-                    existing = []
-                if isinstance(existing, list) and len(existing) > 0:
+                existing_row = existing_by_name.get(nombre)
+                if existing_row is not None:
                     # 2) Fusionar rooms_jsonb agregando solo fechas nuevas
-                    existing_row = existing[0]
-                    existing_rooms = existing_row.get("rooms_jsonb") or {}
-                    new_rooms = data["rooms_jsonb"] or {}
-                    merged_rooms = dict(existing_rooms)
-                    # Agregar solo las fechas que no existen actualmente
-                    for date_key, rooms_list in (new_rooms.items() if isinstance(new_rooms, dict) else []):
-                        if date_key not in merged_rooms:
-                            merged_rooms[date_key] = rooms_list
+                    merged_rooms = merge_new_dates(existing_row.get("rooms_jsonb"), data["rooms_jsonb"])
+                    existing_row["rooms_jsonb"] = merged_rooms
                     # 3) PATCH para actualizar rooms_jsonb y fecha_scrape
                     patch_payload = {
                         "rooms_jsonb": merged_rooms,
@@ -348,13 +418,35 @@ def insert_hotels_supabase(hotels: List[Dict[str, Any]], ciudad: str):
                         json=patch_payload,
                     )
                     logger.info(f"[PATCH] {nombre} ({ciudad}) Status: {r_patch.status_code} Body: {r_patch.text}")
+                elif nombre in new_rows:
+                    # Hotel repetido en el mismo lote: fusionar sus fechas
+                    pending = new_rows[nombre]
+                    pending["rooms_jsonb"] = merge_new_dates(pending["rooms_jsonb"], data["rooms_jsonb"])
                 else:
-                    # 4) Insertar nuevo registro
-                    r_insert = post_hotel(session, base_url, headers, data)
-                    logger.info(f"[INSERT] {nombre} ({ciudad}) Status: {r_insert.status_code} Body: {r_insert.text}")
+                    new_rows[nombre] = data
             except Exception as e:
                 logger.error(f"Error upserting: {data}")
                 logger.error(f"Exception: {e}")
+        if new_rows:
+            # 4) Insertar todos los registros nuevos en una sola petición
+            bulk_ok = False
+            try:
+                r_insert = post_hotel(session, base_url, headers, list(new_rows.values()))
+                logger.info(f"[INSERT] {len(new_rows)} hoteles ({ciudad}) Status: {r_insert.status_code} Body: {r_insert.text}")
+                bulk_ok = r_insert.ok
+            except Exception as e:
+                logger.error(f"Error insertando {len(new_rows)} hoteles en {ciudad}")
+                logger.error(f"Exception: {e}")
+            if not bulk_ok:
+                # El insert en lote es todo o nada: reintentar uno por uno para
+                # que un registro rechazado no descarte a los demás
+                for nombre, data in new_rows.items():
+                    try:
+                        r_insert = post_hotel(session, base_url, headers, data)
+                        logger.info(f"[INSERT] {nombre} ({ciudad}) Status: {r_insert.status_code} Body: {r_insert.text}")
+                    except Exception as e:
+                        logger.error(f"Error upserting: {data}")
+                        logger.error(f"Exception: {e}")
 
 # =============================
 # CLI principal
@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { createServerClient } from '@supabase/ssr'
+import { parsePriceToNumber } from '@/lib/priceUtils'
 
 type PriceRow = {
   hotel_name?: string | null
@@ -11,32 +12,6 @@ function formatISODate(d: Date): string {
   return new Date(d.getTime() - d.getTimezoneOffset() * 60000).toISOString().slice(0, 10)
 }
 
-function parsePriceToNumber(text?: string | number | null): number | null {
-  if (text == null) return null
-  if (typeof text === 'number') return Number.isFinite(text) ? text : null
-  let cleaned = text.replace(/[^0-9.,-]/g, '')
-  const hasComma = cleaned.includes(',')
-  const hasDot = cleaned.includes('.')
-  if (hasComma && hasDot) {
-    cleaned = cleaned.replace(/,/g, '')
-  } else if (hasComma && !hasDot) {
-    const onlyDigitsAndCommas = /^[0-9,]+$/.test(cleaned)
-    const looksLikeThousands = onlyDigitsAndCommas && /^(?:\d{1,3})(?:,\d{3})+$/.test(cleaned)
-    if (looksLikeThousands) {
-      cleaned = cleaned.replace(/,/g, '')
-    } else {
-      cleaned = cleaned.replace(/\./g, '').replace(/,/g, '.')
-    }
-  } else {
-    const onlyDigitsAndDots = /^[0-9.]+$/.test(cleaned)
-    const looksLikeDotThousands = onlyDigitsAndDots && /^(?:\d{1,3})(?:\.\d{3})+$/.test(cleaned)
-    if (looksLikeDotThousands) cleaned = cleaned.replace(/\./g, '')
-    cleaned = cleaned.replace(/,/g, '')
-  }
-  const n = Number.parseFloat(cleaned)
-  return Number.isFinite(n) ? n : null
-}
-
 export async function POST(request: NextRequest) {
   const response = NextResponse.next()
   const supabase = createServerClient(
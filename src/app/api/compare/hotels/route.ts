@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { createServerClient } from '@supabase/ssr'
+import { average, parsePriceToNumber, priceRank } from '@/lib/priceUtils'
 
 type HotelParallelRow = {
   nombre?: string | null
@@ -11,46 +12,6 @@ type HotelParallelRow = {
 
 type RoomPrice = { room_type?: string; price?: string }
 
-function parsePriceToNumber(text?: string | number | null): number | null {
-  if (text == null) return null
-  if (typeof text === 'number') return Number.isFinite(text) ? text : null
-  // Remove currency symbols and spaces, keep digits, dots and commas
-  let cleaned = text.replace(/[^0-9.,-]/g, '')
-
-  const hasComma = cleaned.includes(',')
-  const hasDot = cleaned.includes('.')
-
-  if (hasComma && hasDot) {
-    // Likely thousands (comma) and decimals (dot): "$1,234.56" → "1234.56"
-    cleaned = cleaned.replace(/,/g, '')
-  } else if (hasComma && !hasDot) {
-    // Only commas present. Decide if commas are thousands or decimal separator.
-    const onlyDigitsAndCommas = /^[0-9,]+$/.test(cleaned)
-    const looksLikeThousands = onlyDigitsAndCommas && /^(?:\d{1,3})(?:,\d{3})+$/.test(cleaned)
-    if (looksLikeThousands) {
-      // "1,234" or "12,345,678" → thousands
-      cleaned = cleaned.replace(/,/g, '')
-    } else {
-      // Treat comma as decimal separator: "123,45" → "123.45"
-      cleaned = cleaned.replace(/\./g, '')
-      cleaned = cleaned.replace(/,/g, '.')
-    }
-  } else {
-    // No commas
-    const onlyDigitsAndDots = /^[0-9.]+$/.test(cleaned)
-    const looksLikeDotThousands = onlyDigitsAndDots && /^(?:\d{1,3})(?:\.\d{3})+$/.test(cleaned)
-    if (looksLikeDotThousands) {
-      // "1.234" or "12.345.678" → treat dots as thousands
-      cleaned = cleaned.replace(/\./g, '')
-    } else {
-      // Assume dot is decimal separator; just ensure commas removed
-      cleaned = cleaned.replace(/,/g, '')
-    }
-  }
-  const n = Number.parseFloat(cleaned)
-  return Number.isFinite(n) ? n : null
-}
-
 function getDateCandidates(): string[] {
   const now = new Date()
   const iso = now.toISOString().slice(0, 10)
@@ -238,7 +199,7 @@ export async function POST(request: NextRequest) {
     const myPrices = (myFilteredRows || [])
       .map((r: unknown) => parsePriceToNumber((r as Record<string, unknown>)?.price as string))
       .filter((n: number | null): n is number => n != null)
-    const myAvg = myPrices.length ? myPrices.reduce((a: number, b: number) => a + b, 0) / myPrices.length : null
+    const myAvg = average(myPrices)
 
     // 2) Competitors from hotels_parallel/hoteles_parallel filtered by city
     let competitorRows: HotelParallelRow[] = []
@@ -348,8 +309,8 @@ export async function POST(request: NextRequest) {
         const nums = filteredRooms
           .map((r: RoomPrice) => parsePriceToNumber(r?.price))
           .filter((n: number | null): n is number => n != null)
-        if (!nums.length) return null
-        const avg = nums.reduce((a: number, b: number) => a + b, 0) / nums.length
+        const avg = average(nums)
+        if (avg == null) return null
         const s = (row as Record<string, unknown>)?.estrellas
         
         console.log(`[DIAGNOSTIC] Raw 'estrellas' value for hotel ${row.nombre}:`, s, `(type: ${typeof s})`);
@@ -373,12 +334,8 @@ export async function POST(request: NextRequest) {
       : null
 
     // Ranking
-    const allForRanking: Array<{ name: string; avg: number; isUser: boolean }> = []
-    if (myAvg != null) allForRanking.push({ name: myHotelName, avg: myAvg, isUser: true })
-    for (const c of competitors) allForRanking.push({ name: c.name, avg: c.avg, isUser: false })
-    allForRanking.sort((a, b) => a.avg - b.avg)
     const position = myAvg != null
-      ? allForRanking.findIndex((h) => h.isUser) + 1
+      ? priceRank(myAvg, competitors.map((c) => c.avg))
       : null
 
     const today = canonicalToday
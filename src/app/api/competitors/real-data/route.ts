@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { createServerClient } from '@supabase/ssr'
+import { priceRank } from '@/lib/priceUtils'
 
 interface CompetitorData {
   id: string
@@ -26,6 +27,10 @@ interface UserHotelData {
   revpar: number
 }
 
+// Assumed occupancy rates for RevPAR until real occupancy data is available
+const USER_OCCUPANCY_RATE = 0.85
+const COMPETITOR_OCCUPANCY_RATE = 0.80
+
 export async function POST(request: NextRequest) {
   const response = NextResponse.next()
   
@@ -109,13 +114,41 @@ export async function POST(request: NextRequest) {
     const currentDate = new Date().toISOString().split('T')[0]
     console.log('Analysis date:', currentDate)
     
-    // 1. Fetch user's hotel data
-    console.log('Fetching user hotel data...')
-    const { data: userHotelData, error: userHotelError } = await supabase
-      .from('hotel_usuario')
-      .select('*')
-      .eq('user_id', user.id)
-      .eq('checkin_date', currentDate)
+    // First competitor attempt: hoteles_parallel (your main data). It does not
+    // depend on the user's hotel rows, so it runs alongside that query.
+    const fetchPrimaryCompetitors = async () => {
+      try {
+        let competitorQuery = supabase
+          .from('hoteles_parallel')
+          .select('*')
+
+        // Try to filter by city, but if ciudad column is empty, get all hotels
+        // We'll filter by city name in the hotel name or other fields later
+        if (userCity && userCity !== 'Tijuana') {
+          competitorQuery = competitorQuery.or(`ciudad.ilike.%${userCity}%,nombre.ilike.%${userCity}%`)
+        }
+
+        // Apply star rating filter if specified
+        if (selectedStars && selectedStars !== 'All') {
+          competitorQuery = competitorQuery.eq('estrellas', parseInt(selectedStars))
+        }
+
+        return await competitorQuery
+      } catch {
+        return null
+      }
+    }
+
+    // 1. Fetch user's hotel data (and the primary competitor data concurrently)
+    console.log('Fetching user hotel and competitor data...')
+    const [{ data: userHotelData, error: userHotelError }, primaryCompetitorResult] = await Promise.all([
+      supabase
+        .from('hotel_usuario')
+        .select('*')
+        .eq('user_id', user.id)
+        .eq('checkin_date', currentDate),
+      fetchPrimaryCompetitors()
+    ])
 
     if (userHotelError) {
       console.error('Error fetching user hotel data:', userHotelError)
@@ -127,60 +160,44 @@ export async function POST(request: NextRequest) {
 
     console.log('User hotel data found:', userHotelData?.length || 0, 'records')
 
-    // Process user hotel data
+    // Process user hotel data (each price is parsed once and reused for the average)
+    const userRoomTypes: RoomTypeData[] = (userHotelData || []).map(room => ({
+      roomType: room.room_type,
+      price: parseFloat(room.price),
+      date: room.checkin_date
+    }))
+    let userPriceSum = 0
+    for (const room of userRoomTypes) userPriceSum += room.price
+
     const userHotel: UserHotelData = {
       hotelName: userHotelData?.[0]?.hotel_name || 'Your Hotel',
-      roomTypes: userHotelData?.map(room => ({
-        roomType: room.room_type,
-        price: parseFloat(room.price),
-        date: room.checkin_date
-      })) || [],
-      avgPrice: userHotelData?.length ? 
-        userHotelData.reduce((sum, room) => sum + parseFloat(room.price), 0) / userHotelData.length : 0,
+      roomTypes: userRoomTypes,
+      avgPrice: userRoomTypes.length ? userPriceSum / userRoomTypes.length : 0,
       stars: userHotelData?.[0]?.estrellas || 4,
       revpar: 0 // Will be calculated below
     }
 
     // Calculate RevPAR for user hotel (assume 85% occupancy for now)
-    const occupancyRate = 0.85
-    userHotel.revpar = userHotel.avgPrice * occupancyRate
+    userHotel.revpar = userHotel.avgPrice * USER_OCCUPANCY_RATE
 
     console.log('User hotel processed:', userHotel)
 
-    // 2. Fetch competitor data
-    console.log('Fetching competitor data...')
-    
+    // 2. Resolve competitor data
     // Try hoteles_parallel first (your main competitor data), then fallback to hotels_parallel
     let competitorData = null
     let competitorError = null
     
-    // First attempt: hoteles_parallel (your main data)
-    try {
-      let competitorQuery = supabase
-        .from('hoteles_parallel')
-        .select('*')
+    // First attempt: hoteles_parallel (your main data), fetched above
+    if (primaryCompetitorResult) {
+      competitorData = primaryCompetitorResult.data
+      competitorError = primaryCompetitorResult.error
 
-      // Try to filter by city, but if ciudad column is empty, get all hotels
-      // We'll filter by city name in the hotel name or other fields later
-      if (userCity && userCity !== 'Tijuana') {
-        competitorQuery = competitorQuery.or(`ciudad.ilike.%${userCity}%,nombre.ilike.%${userCity}%`)
-      }
-
-      // Apply star rating filter if specified
-      if (selectedStars && selectedStars !== 'All') {
-        competitorQuery = competitorQuery.eq('estrellas', parseInt(selectedStars))
-      }
-
-      const result = await competitorQuery
-      competitorData = result.data
-      competitorError = result.error
-      
       if (competitorData && competitorData.length > 0) {
         console.log(`✅ Found ${competitorData.length} competitors in hoteles_parallel`)
       } else {
         console.log('⚠️  No competitors found in hoteles_parallel, trying hotels_parallel...')
       }
-    } catch {
+    } else {
       console.log('⚠️  Error with hoteles_parallel, trying hotels_parallel...')
     }
     
@@ -305,8 +322,7 @@ export async function POST(request: NextRequest) {
           }
           
           // Calculate RevPAR (assume 80% occupancy for competitors)
-          const competitorOccupancy = 0.80
-          const revpar = avgPrice * competitorOccupancy
+          const revpar = avgPrice * COMPETITOR_OCCUPANCY_RATE
 
           return {
             id: hotel.id,
@@ -327,24 +343,23 @@ export async function POST(request: NextRequest) {
 
     console.log('Processed competitors:', competitors.length)
 
-    // 3. Calculate market averages
-    const marketAvgPrice = competitors.length ? 
-      competitors.reduce((sum, comp) => sum + comp.avgPrice, 0) / competitors.length : 0
-    
-    const marketAvgRevpar = competitors.length ? 
-      competitors.reduce((sum, comp) => sum + comp.revpar, 0) / competitors.length : 0
+    // 3. Calculate market averages (price and RevPAR in one pass)
+    let priceSum = 0
+    let revparSum = 0
+    for (const comp of competitors) {
+      priceSum += comp.avgPrice
+      revparSum += comp.revpar
+    }
+    const marketAvgPrice = competitors.length ? priceSum / competitors.length : 0
+    const marketAvgRevpar = competitors.length ? revparSum / competitors.length : 0
 
     // 4. Calculate price difference and ranking
     const priceDifference = userHotel.avgPrice - marketAvgPrice
     const priceDifferencePercent = marketAvgPrice > 0 ? (priceDifference / marketAvgPrice) * 100 : 0
 
     // Rank hotels by price
-    const allHotels = [
-      { name: userHotel.hotelName, avgPrice: userHotel.avgPrice, isUser: true },
-      ...competitors.map(comp => ({ name: comp.name, avgPrice: comp.avgPrice, isUser: false }))
-    ].sort((a, b) => a.avgPrice - b.avgPrice)
-
-    const userRank = allHotels.findIndex(hotel => hotel.isUser) + 1
+    const userRank = priceRank(userHotel.avgPrice, competitors.map(comp => comp.avgPrice))
+    const totalHotels = competitors.length + 1
 
     // 5. Prepare response data
     const responseData = {
@@ -357,7 +372,7 @@ export async function POST(request: NextRequest) {
         priceDifference,
         priceDifferencePercent,
         userRank,
-        totalHotels: allHotels.length
+        totalHotels
       },
       filters: {
         selectedStars,
@@ -1,5 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { createServerClient } from '@supabase/ssr'
+import { parsePriceToNumber } from '@/lib/priceUtils'
 
 export const dynamic = 'force-dynamic'
 export const runtime = 'nodejs'
@@ -11,47 +12,6 @@ function formatDate(date: Date): string {
   return `${year}-${month}-${day}`
 }
 
-function parsePriceToNumber(text?: string | number | null): number | null {
-  if (text == null) return null
-  if (typeof text === 'number') return Number.isFinite(text) ? text : null
-  
-  // Remove currency symbols and spaces, keep digits, dots and commas
-  let cleaned = text.replace(/[^0-9.,-]/g, '')
-  
-  const hasComma = cleaned.includes(',')
-  const hasDot = cleaned.includes('.')
-  
-  if (hasComma && hasDot) {
-    // Likely thousands (comma) and decimals (dot): "$1,234.56" → "1234.56"
-    cleaned = cleaned.replace(/,/g, '')
-  } else if (hasComma && !hasDot) {
-    // Only commas present. Decide if commas are thousands or decimal separator.
-    const onlyDigitsAndCommas = /^[0-9,]+$/.test(cleaned)
-    const looksLikeThousands = onlyDigitsAndCommas && /^(?:\d{1,3})(?:,\d{3})+$/.test(cleaned)
-    if (looksLikeThousands) {
-      // "1,234" or "12,345,678" → thousands
-      cleaned = cleaned.replace(/,/g, '')
-    } else {
-      // Treat comma as decimal separator: "123,45" → "123.45"
-      cleaned = cleaned.replace(/\./g, '')
-      cleaned = cleaned.replace(/,/g, '.')
-    }
-  } else {
-    // No commas
-    const onlyDigitsAndDots = /^[0-9.]+$/.test(cleaned)
-    const looksLikeDotThousands = onlyDigitsAndDots && /^(?:\d{1,3})(?:\.\d{3})+$/.test(cleaned)
-    if (looksLikeDotThousands) {
-      // "1.234" or "12.345.678" → treat dots as thousands
-      cleaned = cleaned.replace(/\./g, '')
-    } else {
-      // Assume dot is decimal separator; just ensure commas removed
-      cleaned = cleaned.replace(/,/g, '')
-    }
-  }
-  const n = Number.parseFloat(cleaned)
-  return Number.isFinite(n) ? n : null
-}
-
 export async function GET(request: NextRequest) {
   const response = NextResponse.next()
   const supabase = createServerClient(
@@ -18,8 +18,37 @@ if (!AMADEUS_AVAILABLE) {
   console.log('⚠️ Continuando sin búsqueda de hoteles competidores...');
 }
 
+// --- Cliente HTTP para Amadeus ---
+// fetch de Node ya reutiliza conexiones keep-alive por host; aquí solo se
+// agregan reintentos con backoff para errores transitorios.
+const RETRY_STATUSES = new Set([429, 500, 502, 503, 504]);
+const MAX_RETRIES = 3;
+const BACKOFF_MS = 300;
+
+async function amadeusFetch(url: string, init: RequestInit): Promise<Response> {
+  for (let attempt = 0; ; attempt++) {
+    const response = await fetch(url, init);
+    if (!RETRY_STATUSES.has(response.status) || attempt >= MAX_RETRIES) {
+      return response;
+    }
+    // Liberar la conexión antes de reintentar
+    await response.body?.cancel();
+    await new Promise(resolve => setTimeout(resolve, BACKOFF_MS * 2 ** attempt));
+  }
+}
+
+// --- Token de acceso en caché ---
+// El proceso de Node atiende muchas solicitudes; el token (válido ~30 min) se
+// reutiliza hasta un minuto antes de expirar.
+const TOKEN_EXPIRY_MARGIN_MS = 60_000;
+let cachedToken: { token: string; expiresAt: number } | null = null;
+
 // --- Función para obtener token de acceso ---
 async function getAccessToken() {
+  if (cachedToken && cachedToken.expiresAt > Date.now()) {
+    return cachedToken.token;
+  }
+
   const url = "https://test.api.amadeus.com/v1/security/oauth2/token";
   const headers = { "Content-Type": "application/x-www-form-urlencoded" };
   const data = new URLSearchParams({
@@ -29,7 +58,7 @@ async function getAccessToken() {
   });
 
   try {
-    const response = await fetch(url, {
+    const response = await amadeusFetch(url, {
       method: 'POST',
       headers,
       body: data
@@ -40,6 +69,11 @@ async function getAccessToken() {
     }
 
     const result = await response.json();
+    const expiresInMs = (Number(result.expires_in) || 0) * 1000;
+    cachedToken = {
+      token: result.access_token,
+      expiresAt: Date.now() + expiresInMs - TOKEN_EXPIRY_MARGIN_MS
+    };
     return result.access_token;
   } catch (error) {
     console.error('❌ Error obteniendo token:', (error as Error).message);
@@ -47,43 +81,33 @@ async function getAccessToken() {
   }
 }
 
-// --- Función para calcular distancia ---
-function calculateDistance(lat1: number, lon1: number, lat2: number, lon2: number) {
-  try {
-    // Validar que las coordenadas sean números válidos
-    if (![lat1, lon1, lat2, lon2].every(coord => typeof coord === 'number' && !isNaN(coord))) {
-      return 0.0;
-    }
-
-    // Convertir grados a radianes
-    const toRadians = (degrees: number) => degrees * (Math.PI / 180);
-    const lat1Rad = toRadians(lat1);
-    const lon1Rad = toRadians(lon1);
-    const lat2Rad = toRadians(lat2);
-    const lon2Rad = toRadians(lon2);
-
-    // Diferencia de coordenadas
-    const dlat = lat2Rad - lat1Rad;
-    const dlon = lon2Rad - lon1Rad;
-
-    // Fórmula de Haversine
-    const a = Math.sin(dlat/2)**2 + Math.cos(lat1Rad) * Math.cos(lat2Rad) * Math.sin(dlon/2)**2;
-    const c = 2 * Math.asin(Math.sqrt(a));
-
-    // Radio de la Tierra en kilómetros
-    const r = 6371;
-
-    const distance = c * r;
-
-    // Asegurar que la distancia sea un número válido
-    if (isNaN(distance) || !isFinite(distance)) {
-      return 0.0;
-    }
-
-    return Math.round(distance * 10) / 10; // Redondear a 1 decimal
-  } catch (error) {
-    return 0.0;
+// Máximo de hoteles devueltos por búsqueda
+const MAX_HOTELS = 50;
+
+// --- Constantes geográficas ---
+const EARTH_RADIUS_KM = 6371.0;
+const DEG_TO_RAD = Math.PI / 180;
+
+// --- Función para calcular distancias en lote (Haversine) ---
+// Recibe las coordenadas de todos los hoteles en arreglos contiguos y devuelve
+// las distancias en km desde el origen, redondeadas a 1 decimal (0 si no son
+// válidas), en un solo recorrido.
+function haversineBatch(lat0: number, lng0: number, lats: Float64Array, lngs: Float64Array): Float64Array {
+  const lat1 = lat0 * DEG_TO_RAD;
+  const lon1 = lng0 * DEG_TO_RAD;
+  const cosLat1 = Math.cos(lat1); // Constante para todo el lote
+  const distances = new Float64Array(lats.length);
+
+  for (let i = 0; i < lats.length; i++) {
+    const lat2 = lats[i] * DEG_TO_RAD;
+    const dlat = lat2 - lat1;
+    const dlon = lngs[i] * DEG_TO_RAD - lon1;
+    const a = Math.sin(dlat/2)**2 + cosLat1 * Math.cos(lat2) * Math.sin(dlon/2)**2;
+    const d = 2 * EARTH_RADIUS_KM * Math.asin(Math.sqrt(a));
+    distances[i] = d > 0 && d < Infinity ? Math.round(d * 10) / 10 : 0.0;
   }
+
+  return distances;
 }
 
 // --- Función para obtener hoteles por geocódigo ---
@@ -93,7 +117,7 @@ async function getHotelsByGeocode(lat: number, lng: number, token: string | null
     return [];
   }
   
-  const accessToken = token || await getAccessToken();
+  let accessToken = token || await getAccessToken();
   const url = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-geocode";
   
   const params = new URLSearchParams({
@@ -103,12 +127,25 @@ async function getHotelsByGeocode(lat: number, lng: number, token: string | null
   });
 
   try {
-    const response = await fetch(`${url}?${params}`, {
+    let response = await amadeusFetch(`${url}?${params}`, {
       headers: {
         "Authorization": `Bearer ${accessToken}`
       }
     });
 
+    // Amadeus puede rechazar el token antes de la expiración calculada:
+    // invalidar la caché y reintentar una vez con un token nuevo
+    if (response.status === 401) {
+      cachedToken = null;
+      await response.body?.cancel();
+      accessToken = await getAccessToken();
+      response = await amadeusFetch(`${url}?${params}`, {
+        headers: {
+          "Authorization": `Bearer ${accessToken}`
+        }
+      });
+    }
+
     if (!response.ok) {
       throw new Error(`Error en la consulta de hoteles: ${await response.text()}`);
     }
@@ -121,34 +158,39 @@ async function getHotelsByGeocode(lat: number, lng: number, token: string | null
 
     let hotels = data.data;
 
-    // Filtrar por palabra clave si se proporciona
+    // Filtrar por palabra clave si se proporciona (by-geocode no acepta filtro
+    // por nombre), deteniéndose al alcanzar el límite de resultados
     if (keyword) {
-      hotels = hotels.filter((hotel: any) => 
-        hotel.name && hotel.name.toLowerCase().includes(keyword.toLowerCase())
-      );
+      const needle = keyword.toLowerCase();
+      const matches: any[] = [];
+      for (const hotel of hotels) {
+        if (hotel.name && hotel.name.toLowerCase().includes(needle)) {
+          matches.push(hotel);
+          if (matches.length === MAX_HOTELS) break;
+        }
+      }
+      hotels = matches;
     }
 
     // Limitar resultados para evitar sobrecarga
-    hotels = hotels.slice(0, 50);
-
-    // Agregar información de distancia si no está presente
-    for (const hotel of hotels) {
-      if (hotel.geoCode && hotel.geoCode.latitude && hotel.geoCode.longitude) {
-        // Calcular distancia aproximada si no está presente
-        if (!hotel.distance) {
-          const distance = calculateDistance(
-            lat, lng,
-            hotel.geoCode.latitude,
-            hotel.geoCode.longitude
-          );
-          // Solo asignar si la distancia es válida
-          if (distance > 0) {
-            hotel.distance = distance;
-          } else {
-            hotel.distance = 0.0;
-          }
-        }
-      }
+    hotels = hotels.slice(0, MAX_HOTELS);
+
+    // Agregar información de distancia solo a los hoteles que no la traen
+    // de Amadeus y que tienen coordenadas
+    const pending = hotels.filter((hotel: any) => {
+      if (hotel.distance) return false;
+      const geoCode = hotel.geoCode;
+      return Boolean(geoCode && geoCode.latitude && geoCode.longitude);
+    });
+    if (pending.length > 0) {
+      const distances = haversineBatch(
+        Number(lat), Number(lng),
+        Float64Array.from(pending, (hotel: any) => Number(hotel.geoCode.latitude)),
+        Float64Array.from(pending, (hotel: any) => Number(hotel.geoCode.longitude))
+      );
+      pending.forEach((hotel: any, i: number) => {
+        hotel.distance = distances[i];
+      });
     }
 
     return hotels;
@@ -0,0 +1,63 @@
+/**
+ * Price parsing shared by the API routes
+ */
+
+// Compiled once at module load instead of on every call
+const NON_NUMERIC_RE = /[^0-9.,-]/g
+const COMMA_RE = /,/g
+const DOT_RE = /\./g
+const COMMA_THOUSANDS_RE = /^(?:\d{1,3})(?:,\d{3})+$/
+const DOT_THOUSANDS_RE = /^(?:\d{1,3})(?:\.\d{3})+$/
+
+// Parse a scraped price ("$1,234.56", "MXN 1.234", "123,45", 99) into a number
+export function parsePriceToNumber(text?: string | number | null): number | null {
+  if (text == null) return null
+  if (typeof text === 'number') return Number.isFinite(text) ? text : null
+  // Remove currency symbols and spaces, keep digits, dots and commas
+  let cleaned = text.replace(NON_NUMERIC_RE, '')
+
+  const hasComma = cleaned.includes(',')
+  const hasDot = cleaned.includes('.')
+
+  if (hasComma && hasDot) {
+    // Likely thousands (comma) and decimals (dot): "$1,234.56" → "1234.56"
+    cleaned = cleaned.replace(COMMA_RE, '')
+  } else if (hasComma && !hasDot) {
+    // Only commas present. Decide if commas are thousands or decimal separator.
+    // (the thousands pattern already implies only digits and commas)
+    if (COMMA_THOUSANDS_RE.test(cleaned)) {
+      // "1,234" or "12,345,678" → thousands
+      cleaned = cleaned.replace(COMMA_RE, '')
+    } else {
+      // Treat comma as decimal separator: "123,45" → "123.45"
+      cleaned = cleaned.replace(COMMA_RE, '.')
+    }
+  } else {
+    // No commas; otherwise the dot is the decimal separator
+    if (DOT_THOUSANDS_RE.test(cleaned)) {
+      // "1.234" or "12.345.678" → treat dots as thousands
+      cleaned = cleaned.replace(DOT_RE, '')
+    }
+  }
+  const n = Number.parseFloat(cleaned)
+  return Number.isFinite(n) ? n : null
+}
+
+// Mean of already-parsed prices, or null when there are none
+export function average(nums: number[]): number | null {
+  if (!nums.length) return null
+  let sum = 0
+  for (const n of nums) sum += n
+  return sum / nums.length
+}
+
+// 1-based position of userAvg among all hotels sorted by ascending price.
+// Equivalent to a stable sort with the user listed first (ties rank the user
+// ahead), computed by counting strictly cheaper competitors.
+export function priceRank(userAvg: number, competitorAvgs: number[]): number {
+  let rank = 1
+  for (const avg of competitorAvgs) {
+    if (avg < userAvg) rank++
+  }
+  return rank
+}